@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from models import Inventario
+
+
+# Analítica del inventario (NumPy)
+
+class AnaliticaInventario:
+    """
+    Guarda el catálogo como columnas NumPy (cantidad, precio y código de
+    categoría) para calcular totales, percentiles y conteos sin recorrer
+    los productos uno por uno en Python.
+    """
+
+    def __init__(self, cantidades: np.ndarray, precios: np.ndarray, codigos: np.ndarray, categorias: List[str]) -> None:
+        self.cantidades = cantidades
+        self.precios = precios
+        self.codigos = codigos          # índice en self.categorias para cada producto
+        self.categorias = categorias
+
+    @classmethod
+    def desde_filas(cls, filas: Sequence[Tuple[int, float, str]]) -> "AnaliticaInventario":
+        """Construye las columnas a partir de filas (cantidad, precio, categoria)."""
+        n = len(filas)
+        codigos_por_categoria: Dict[str, int] = {}
+        codigos = np.fromiter(
+            (codigos_por_categoria.setdefault(f[2], len(codigos_por_categoria)) for f in filas),
+            dtype=np.int32,
+            count=n,
+        )
+        cantidades = np.fromiter((f[0] for f in filas), dtype=np.int64, count=n)
+        precios = np.fromiter((float(f[1]) for f in filas), dtype=np.float64, count=n)
+        return cls(cantidades, precios, codigos, list(codigos_por_categoria))
+
+    @classmethod
+    def desde_inventario(cls, inventario: Inventario) -> "AnaliticaInventario":
+        return cls.desde_filas([(p.cantidad, p.precio, p.categoria) for p in inventario.listar_todos()])
+
+    def __len__(self) -> int:
+        return len(self.cantidades)
+
+    def _por_categoria(self, pesos: np.ndarray) -> Dict[str, float]:
+        sumas = np.bincount(self.codigos, weights=pesos, minlength=len(self.categorias))
+        return dict(zip(self.categorias, sumas.tolist()))
+
+    # --- Valor del stock ---
+    def valor_total(self) -> float:
+        return float(np.dot(self.cantidades, self.precios))
+
+    def valor_por_categoria(self) -> Dict[str, float]:
+        """Suma de cantidad * precio agrupada por categoría."""
+        return self._por_categoria(self.cantidades * self.precios)
+
+    def unidades_por_categoria(self) -> Dict[str, int]:
+        return {c: int(v) for c, v in self._por_categoria(self.cantidades).items()}
+
+    # --- Distribución de precios ---
+    def percentiles_precio(self, percentiles: Iterable[float] = (25, 50, 75, 90, 99)) -> Dict[float, float]:
+        percentiles = list(percentiles)
+        if not len(self):
+            return {p: 0.0 for p in percentiles}
+        return dict(zip(percentiles, np.percentile(self.precios, percentiles).tolist()))
+
+    # --- Stock bajo ---
+    def stock_bajo(self, umbral: int) -> int:
+        """Cantidad de productos con menos de `umbral` unidades."""
+        return int(np.count_nonzero(self.cantidades < umbral))
+
+    def stock_bajo_por_categoria(self, umbral: int) -> Dict[str, int]:
+        bajos = (self.cantidades < umbral).astype(np.int64)
+        return {c: int(v) for c, v in self._por_categoria(bajos).items()}
@@ -1,24 +1,28 @@
 import mysql.connector
 import json, csv, os, secrets
+import math
+import threading
+import time
 import re 
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, redirect, url_for, flash, session, Response
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, Response, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from aiomysql import DataError, IntegrityError, ProgrammingError
+from conexion.conexion_async import MySQLAsync
 
 # -----------------------------
 # Configuración de la aplicación
 # -----------------------------
-app = Flask(__name__)
-app.secret_key = "supersecreto"
+# Las rutas se registran en el blueprint y se montan en create_app()
+bp = Blueprint("main", __name__)
 
 # -----------------------------
 # Configuración LoginManager
 # -----------------------------
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
+login_manager.login_view = "main.login"
 
 # -----------------------------
 # Configuración MySQL
@@ -34,17 +38,57 @@ MYSQL_CONFIG = {
 def get_mysql_connection_local():
     return mysql.connector.connect(**MYSQL_CONFIG)
 
+# Hilos por worker de gunicorn (ver Procfile); el pool async se dimensiona igual
+# para que ningún hilo tenga que esperar una conexión libre
+HILOS_WORKER = int(os.environ.get("HILOS_WORKER", "64"))
+
+# Pool async compartido para consultas puntuales y las que se lanzan en paralelo
+mysql_async = MySQLAsync(**MYSQL_CONFIG, maxsize=HILOS_WORKER)
+
+# Conexión síncrona propia de cada hilo, reutilizada entre peticiones
+_conexion_hilo = threading.local()
+
+def consultar_en_hilo(query, valores=(), diccionario=True):
+    """
+    Lecturas grandes (listados, exportaciones, API). aiomysql decodifica las
+    filas en Python dentro del bucle compartido y bloquearía a las demás
+    peticiones; aquí se decodifican en el hilo de la propia petición.
+    """
+    for intento in range(2):
+        conexion = getattr(_conexion_hilo, "conexion", None)
+        if conexion is None:
+            conexion = get_mysql_connection_local()
+            conexion.autocommit = True
+            _conexion_hilo.conexion = conexion
+        try:
+            cursor = conexion.cursor(dictionary=diccionario)
+            try:
+                cursor.execute(query, valores)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # Conexión caída (p. ej. wait_timeout de MySQL): se abre otra y se reintenta una vez
+            _conexion_hilo.conexion = None
+            if intento:
+                raise
+
 # -----------------------------
 # Configuración de subida de archivos
 # -----------------------------
-UPLOAD_FOLDER = Path("static/portadas")
-UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def guardar_portada(portada_file):
+    """Guarda la portada en UPLOAD_FOLDER (la carpeta se crea en la primera subida) y devuelve su nombre."""
+    carpeta = current_app.config['UPLOAD_FOLDER']
+    carpeta.mkdir(parents=True, exist_ok=True)
+    portada_filename = secure_filename(portada_file.filename)
+    portada_file.save(carpeta / portada_filename)
+    return portada_filename
+
 # -----------------------------
 # Modelo Usuario
 # -----------------------------
@@ -57,12 +101,9 @@ class Usuario(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = get_mysql_connection_local()
-    cursor = conn.cursor(dictionary=True, buffered=True)
-    cursor.execute("SELECT * FROM usuarios WHERE id_usuario = %s", (user_id,))
-    user_data = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    user_data = mysql_async.ejecutar(
+        mysql_async.consultar_uno("SELECT * FROM usuarios WHERE id_usuario = %s", (user_id,))
+    )
     if user_data:
         return Usuario(user_data["id_usuario"], user_data["nombre"], user_data["email"], user_data.get("password"))
     return None
@@ -70,23 +111,23 @@ def load_user(user_id):
 # -----------------------------
 # Rutas públicas
 # -----------------------------
-@app.route("/")
+@bp.route("/")
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for("home"))
-    return redirect(url_for("login"))
+        return redirect(url_for("main.home"))
+    return redirect(url_for("main.login"))
 
-@app.route("/about")
+@bp.route("/about")
 def about():
     return render_template("about.html")
 
 # -----------------------------
 # Registro de usuarios
 # -----------------------------
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for("home"))
+        return redirect(url_for("main.home"))
     if request.method == "POST":
         nombre = request.form["nombre"]
         email = request.form["email"]
@@ -98,10 +139,10 @@ def register():
 
         if not stored_captcha or captcha_input != stored_captcha:
             flash("Código de verificación incorrecto ❌", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         if password != confirm_password:
             flash("Las contraseñas no coinciden ❌", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
 
         conn = get_mysql_connection_local()
         cursor = conn.cursor(dictionary=True, buffered=True)
@@ -110,12 +151,12 @@ def register():
             flash("El correo ya está registrado ❌", "danger")
             cursor.close()
             conn.close()
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         
         # Validación del nombre
         if not re.match(r"^[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+$", nombre):
             flash("El nombre solo puede contener letras y espacios ❌", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
 
 
         hashed_password = generate_password_hash(password)
@@ -125,7 +166,7 @@ def register():
         cursor.close()
         conn.close()
         flash("Registro exitoso ✅, ahora inicia sesión", "success")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     captcha_code = str(secrets.randbelow(900000) + 100000)
     session["captcha_code"] = captcha_code
@@ -134,10 +175,10 @@ def register():
 # -----------------------------
 # Login
 # -----------------------------
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for("home"))
+        return redirect(url_for("main.home"))
     if request.method == "POST":
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "")
@@ -147,7 +188,7 @@ def login():
 
         if not stored_captcha or captcha_input != stored_captcha:
             flash("Código de verificación incorrecto ❌", "danger")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
 
         conn = get_mysql_connection_local()
         cursor = conn.cursor(dictionary=True, buffered=True)
@@ -160,9 +201,9 @@ def login():
             user = Usuario(user_data["id_usuario"], user_data["nombre"], user_data["email"], user_data["password"])
             login_user(user)
             flash(f"Bienvenid@, {user.nombre} 🎉", "success")
-            return redirect(url_for("home"))
+            return redirect(url_for("main.home"))
         flash("Correo o contraseña incorrectos ❌", "danger")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     captcha_code = str(secrets.randbelow(900000) + 100000)
     session["captcha_code"] = captcha_code
@@ -171,17 +212,17 @@ def login():
 # -----------------------------
 # Logout
 # -----------------------------
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
     flash("Sesión cerrada 👋", "info")
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
 # -----------------------------
 # Home
 # -----------------------------
-@app.route("/home")
+@bp.route("/home")
 @login_required
 def home():
     return render_template("home.html", user=current_user)
@@ -189,18 +230,13 @@ def home():
 # -----------------------------
 # Usuarios
 # -----------------------------
-@app.route("/usuarios_view")
+@bp.route("/usuarios_view")
 @login_required
 def usuarios_view():
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
-    cursor.execute("SELECT id_usuario, nombre, email FROM usuarios")
-    usuarios = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    usuarios = consultar_en_hilo("SELECT id_usuario, nombre, email FROM usuarios")
     return render_template("usuarios_view.html", usuarios=usuarios)
 
-@app.route("/formulario", methods=["GET", "POST"])
+@bp.route("/formulario", methods=["GET", "POST"])
 @login_required
 def formulario():
     if request.method == "POST":
@@ -214,7 +250,7 @@ def formulario():
             flash("El correo ya está registrado ❌", "danger")
             cursor.close()
             conn.close()
-            return redirect(url_for("formulario"))
+            return redirect(url_for("main.formulario"))
 
         hashed_password = generate_password_hash(password)
         cursor.execute("INSERT INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)",
@@ -223,17 +259,15 @@ def formulario():
         cursor.close()
         conn.close()
         flash("Usuario registrado manualmente ✅", "success")
-        return redirect(url_for("usuarios_view"))
+        return redirect(url_for("main.usuarios_view"))
     return render_template("formulario.html")
 
 # -----------------------------
 # Inventario / Productos
 # -----------------------------
-@app.route("/inventario", methods=["GET"])
+@bp.route("/inventario", methods=["GET"])
 @login_required
 def inventario_view():
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
     busqueda = request.args.get("busqueda", "").strip()
     if busqueda:
         query = "SELECT * FROM productos WHERE titulo LIKE %s OR autor LIKE %s OR categoria LIKE %s"
@@ -241,13 +275,10 @@ def inventario_view():
     else:
         query = "SELECT * FROM productos"
         valores = ()
-    cursor.execute(query, valores)
-    productos = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    productos = consultar_en_hilo(query, valores)
     return render_template("productos.html", productos=productos)
 
-@app.route("/crear", methods=["GET", "POST"])
+@bp.route("/crear", methods=["GET", "POST"])
 @login_required
 def crear_producto():
     if request.method == "POST":
@@ -257,7 +288,7 @@ def crear_producto():
         # Validación para que solo acepte letras y espacios
         if not re.match(r"^[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+$", autor):
             flash("El autor solo puede contener letras y espacios ❌", "danger")
-            return redirect(url_for("crear_producto"))
+            return redirect(url_for("main.crear_producto"))
         
         categoria = request.form["categoria"]
         cantidad = request.form["cantidad"]
@@ -265,9 +296,7 @@ def crear_producto():
         portada_file = request.files.get("portada")
         portada_filename = None
         if portada_file and allowed_file(portada_file.filename):
-            portada_filename = secure_filename(portada_file.filename)
-            portada_path = app.config['UPLOAD_FOLDER'] / portada_filename
-            portada_file.save(portada_path)
+            portada_filename = guardar_portada(portada_file)
 
         conexion = get_mysql_connection_local()
         cursor = conexion.cursor()
@@ -278,11 +307,12 @@ def crear_producto():
         conexion.commit()
         cursor.close()
         conexion.close()
+        marcar_productos_modificados()
         flash("Producto agregado con éxito ✅")
-        return redirect(url_for("inventario_view"))
+        return redirect(url_for("main.inventario_view"))
     return render_template("crear.html")
 
-@app.route("/editar/<int:id>", methods=["GET", "POST"])
+@bp.route("/editar/<int:id>", methods=["GET", "POST"])
 @login_required
 def editar_producto(id):
     conexion = get_mysql_connection_local()
@@ -298,9 +328,7 @@ def editar_producto(id):
         portada_file = request.files.get("portada")
         portada_filename = producto["portada"]
         if portada_file and allowed_file(portada_file.filename):
-            portada_filename = secure_filename(portada_file.filename)
-            portada_path = app.config['UPLOAD_FOLDER'] / portada_filename
-            portada_file.save(portada_path)
+            portada_filename = guardar_portada(portada_file)
         cursor.execute(
             "UPDATE productos SET titulo=%s, autor=%s, categoria=%s, cantidad=%s, precio=%s, portada=%s WHERE id_producto=%s",
             (titulo, autor, categoria, cantidad, precio, portada_filename, id)
@@ -308,13 +336,14 @@ def editar_producto(id):
         conexion.commit()
         cursor.close()
         conexion.close()
+        marcar_productos_modificados()
         flash("Producto actualizado ✍️")
-        return redirect(url_for("inventario_view"))
+        return redirect(url_for("main.inventario_view"))
     cursor.close()
     conexion.close()
     return render_template("editar.html", producto=producto)
 
-@app.route("/eliminar/<int:id>", methods=["POST"])
+@bp.route("/eliminar/<int:id>", methods=["POST"])
 @login_required
 def eliminar_producto(id):
     conexion = get_mysql_connection_local()
@@ -323,32 +352,114 @@ def eliminar_producto(id):
     conexion.commit()
     cursor.close()
     conexion.close()
+    marcar_productos_modificados()
     flash("Producto eliminado ❌")
-    return redirect(url_for("inventario_view"))
+    return redirect(url_for("main.inventario_view"))
+
+# -----------------------------
+# Analítica del inventario
+# -----------------------------
+# Columnas NumPy del catálogo; se reconstruyen cuando cambia productos_version o,
+# para cubrir escrituras hechas fuera de la aplicación, cada ANALITICA_MAX_EDAD segundos
+ANALITICA_MAX_EDAD = 300
+_analitica_cache = {"version": None, "datos": None, "creado": 0.0}
+_analitica_lock = threading.Lock()
+_productos_version_lista = False
+
+def asegurar_productos_version():
+    """Crea productos_version si la BD es anterior a ella (migración perezosa, una vez por proceso)."""
+    global _productos_version_lista
+    if _productos_version_lista:
+        return
+    mysql_async.ejecutar(mysql_async.modificar(
+        "CREATE TABLE IF NOT EXISTS productos_version (id INT PRIMARY KEY, version BIGINT NOT NULL)"
+    ))
+    mysql_async.ejecutar(mysql_async.modificar(
+        "INSERT IGNORE INTO productos_version (id, version) VALUES (1, 0)"
+    ))
+    _productos_version_lista = True
+
+def marcar_productos_modificados():
+    """
+    Avisa a la caché de analítica de todos los procesos que productos cambió.
+    Se llama después del commit y en su propia transacción corta, así el
+    contador no bloquea las escrituras del catálogo.
+    """
+    asegurar_productos_version()
+    mysql_async.ejecutar(mysql_async.modificar(
+        "UPDATE productos_version SET version = version + 1 WHERE id = 1"
+    ))
+
+def version_productos():
+    try:
+        fila = mysql_async.ejecutar(mysql_async.consultar_uno(
+            "SELECT version FROM productos_version WHERE id = 1", diccionario=False
+        ))
+    except ProgrammingError as e:
+        if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+            raise
+        asegurar_productos_version()
+        return 0
+    return fila[0] if fila else 0
+
+def obtener_analitica():
+    # NumPy solo se carga cuando alguien abre la analítica, no al importar la aplicación
+    from analitica import AnaliticaInventario
+
+    version = version_productos()
+
+    def vigente():
+        return (
+            _analitica_cache["datos"] is not None
+            and _analitica_cache["version"] == version
+            and time.monotonic() - _analitica_cache["creado"] < ANALITICA_MAX_EDAD
+        )
+
+    if not vigente():
+        # Un solo hilo reconstruye; los demás esperan y reutilizan su resultado
+        with _analitica_lock:
+            if not vigente():
+                filas = consultar_en_hilo("SELECT cantidad, precio, categoria FROM productos", diccionario=False)
+                _analitica_cache["datos"] = AnaliticaInventario.desde_filas(filas)
+                _analitica_cache["creado"] = time.monotonic()
+                _analitica_cache["version"] = version
+    return _analitica_cache["datos"]
+
+@bp.route("/analitica", methods=["GET"])
+@login_required
+def analitica_view():
+    umbral = request.args.get("umbral", 5, type=int)
+    datos = obtener_analitica()
+    valor = datos.valor_por_categoria()
+    unidades = datos.unidades_por_categoria()
+    bajos = datos.stock_bajo_por_categoria(umbral)
+    categorias = [
+        {"nombre": c, "valor": valor[c], "unidades": unidades[c], "stock_bajo": bajos[c]}
+        for c in sorted(valor, key=valor.get, reverse=True)
+    ]
+    return render_template(
+        "analitica.html",
+        total_productos=len(datos),
+        valor_total=datos.valor_total(),
+        percentiles=datos.percentiles_precio(),
+        umbral=umbral,
+        stock_bajo=datos.stock_bajo(umbral),
+        categorias=categorias,
+    )
 
 # -----------------------------
 # Exportar Usuarios
 # -----------------------------
-@app.route("/usuarios/<formato>")
+@bp.route("/usuarios/<formato>")
 @login_required
 def usuarios_export(formato):
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
-    cursor.execute("SELECT id_usuario AS id, nombre, email FROM usuarios")
-    usuarios = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    usuarios = consultar_en_hilo("SELECT id_usuario AS id, nombre, email FROM usuarios")
     return render_template("usuarios_exportados.html", usuarios=usuarios, formato=formato)
 
-@app.route("/usuarios/<formato>/descargar")
+@bp.route("/usuarios/<formato>/descargar")
 @login_required
 def descargar_usuarios(formato):
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor()
-    cursor.execute("SELECT id_usuario, nombre, email FROM usuarios")
-    usuarios = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    usuarios = consultar_en_hilo("SELECT id_usuario, nombre, email FROM usuarios", diccionario=False)
 
     if formato == "txt":
         contenido = "\n".join([f"{u[0]} - {u[1]} - {u[2]}" for u in usuarios])
@@ -369,7 +480,7 @@ def descargar_usuarios(formato):
         filename = "usuarios.csv"
     else:
         flash("Formato no soportado ❌", "danger")
-        return redirect(url_for("usuarios_view"))
+        return redirect(url_for("main.usuarios_view"))
 
     return Response(
         contenido,
@@ -380,12 +491,10 @@ def descargar_usuarios(formato):
 # -----------------------------
 # CRUD Pedidos
 # -----------------------------
-@app.route("/pedidos", methods=["GET"])
+@bp.route("/pedidos", methods=["GET"])
 @login_required
 def pedidos_view():
     busqueda = request.args.get("busqueda", "").strip()
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
 
     query_base = """
         SELECT p.id_pedido,
@@ -401,97 +510,67 @@ def pedidos_view():
     if busqueda:
         query_base += " WHERE u.nombre LIKE %s OR pr.titulo LIKE %s"
         valores = (f"{busqueda}%", f"{busqueda}%")
-        cursor.execute(query_base, valores)
     else:
-        cursor.execute(query_base)
+        valores = ()
 
-    pedidos = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    pedidos = consultar_en_hilo(query_base, valores)
     return render_template("pedidos.html", pedidos=pedidos)
 
-@app.route("/pedidos/crear", methods=["GET", "POST"])
+@bp.route("/pedidos/crear", methods=["GET", "POST"])
 @login_required
 def crear_pedido():
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
-    cursor.execute("SELECT id_usuario, nombre FROM usuarios")
-    usuarios = cursor.fetchall()
-    cursor.execute("SELECT id_producto, titulo FROM productos")
-    productos = cursor.fetchall()
-    cursor.close()
-    conexion.close()
-
     if request.method == "POST":
         id_usuario = request.form["id_usuario"]
         id_producto = request.form["id_producto"]
         cantidad = request.form["cantidad"]
 
-        conexion = get_mysql_connection_local()
-        cursor = conexion.cursor()
-        cursor.execute(
+        mysql_async.ejecutar(mysql_async.modificar(
             "INSERT INTO pedidos (id_usuario, id_producto, cantidad, fecha_pedido) VALUES (%s, %s, %s, NOW())",
             (id_usuario, id_producto, cantidad)
-        )
-        conexion.commit()
-        cursor.close()
-        conexion.close()
+        ))
         flash("Pedido agregado con éxito ✅")
-        return redirect(url_for("pedidos_view"))
+        return redirect(url_for("main.pedidos_view"))
 
+    # Las consultas son independientes: se lanzan a la vez con conexiones distintas del pool
+    usuarios, productos = mysql_async.ejecutar_todos(
+        mysql_async.consultar_todos("SELECT id_usuario, nombre FROM usuarios"),
+        mysql_async.consultar_todos("SELECT id_producto, titulo FROM productos"),
+    )
     return render_template("crear_pedido.html", usuarios=usuarios, productos=productos)
 
-@app.route("/pedidos/editar/<int:id>", methods=["GET", "POST"])
+@bp.route("/pedidos/editar/<int:id>", methods=["GET", "POST"])
 @login_required
 def editar_pedido(id):
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM pedidos WHERE id_pedido = %s", (id,))
-    pedido = cursor.fetchone()
-    cursor.execute("SELECT id_usuario, nombre FROM usuarios")
-    usuarios = cursor.fetchall()
-    cursor.execute("SELECT id_producto, titulo FROM productos")
-    productos = cursor.fetchall()
-    cursor.close()
-    conexion.close()
-
     if request.method == "POST":
         id_usuario = request.form["id_usuario"]
         id_producto = request.form["id_producto"]
         cantidad = request.form["cantidad"]
 
-        conexion = get_mysql_connection_local()
-        cursor = conexion.cursor()
-        cursor.execute(
+        mysql_async.ejecutar(mysql_async.modificar(
             "UPDATE pedidos SET id_usuario=%s, id_producto=%s, cantidad=%s WHERE id_pedido=%s",
             (id_usuario, id_producto, cantidad, id)
-        )
-        conexion.commit()
-        cursor.close()
-        conexion.close()
+        ))
         flash("Pedido actualizado ✍️")
-        return redirect(url_for("pedidos_view"))
+        return redirect(url_for("main.pedidos_view"))
 
+    pedido, usuarios, productos = mysql_async.ejecutar_todos(
+        mysql_async.consultar_uno("SELECT * FROM pedidos WHERE id_pedido = %s", (id,)),
+        mysql_async.consultar_todos("SELECT id_usuario, nombre FROM usuarios"),
+        mysql_async.consultar_todos("SELECT id_producto, titulo FROM productos"),
+    )
     return render_template("editar_pedido.html", pedido=pedido, usuarios=usuarios, productos=productos)
 
-@app.route("/pedidos/eliminar/<int:id>", methods=["POST"])
+@bp.route("/pedidos/eliminar/<int:id>", methods=["POST"])
 @login_required
 def eliminar_pedido(id):
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor()
-    cursor.execute("DELETE FROM pedidos WHERE id_pedido = %s", (id,))
-    conexion.commit()
-    cursor.close()
-    conexion.close()
+    mysql_async.ejecutar(mysql_async.modificar("DELETE FROM pedidos WHERE id_pedido = %s", (id,)))
     flash("Pedido eliminado ❌")
-    return redirect(url_for("pedidos_view"))
+    return redirect(url_for("main.pedidos_view"))
 
-@app.route("/pedidos/<formato>/descargar")
+@bp.route("/pedidos/<formato>/descargar")
 @login_required
 def descargar_pedidos(formato):
-    conexion = get_mysql_connection_local()
-    cursor = conexion.cursor()
-    cursor.execute("""
+    pedidos = consultar_en_hilo("""
         SELECT p.id_pedido,
                u.nombre AS cliente,
                pr.titulo AS producto,
@@ -500,10 +579,7 @@ def descargar_pedidos(formato):
         FROM pedidos p
         JOIN usuarios u ON p.id_usuario = u.id_usuario
         JOIN productos pr ON p.id_producto = pr.id_producto
-    """)
-    pedidos = cursor.fetchall()
-    cursor.close()
-    conexion.close()
+    """, diccionario=False)
 
     if formato == "txt":
         contenido = "\n".join([f"{p[0]} - {p[1]} - {p[2]} - {p[3]} - {p[4]}" for p in pedidos])
@@ -524,7 +600,7 @@ def descargar_pedidos(formato):
         filename = "pedidos.csv"
     else:
         flash("Formato no soportado ❌", "danger")
-        return redirect(url_for("pedidos_view"))
+        return redirect(url_for("main.pedidos_view"))
 
     return Response(
         contenido,
@@ -532,11 +608,287 @@ def descargar_pedidos(formato):
         headers={"Content-Disposition": f"attachment;filename={filename}"}
     )
 
+# -----------------------------
+# Operaciones masivas (productos y pedidos)
+# -----------------------------
+# Filtros admitidos -> condición SQL; cada operación es una sola sentencia (una transacción)
+FILTROS_MASIVOS_PRODUCTOS = {
+    "categoria": "categoria = %s",
+    "autor": "autor = %s",
+}
+FILTROS_MASIVOS_PEDIDOS = {
+    "id_usuario": "id_usuario = %s",
+    "id_producto": "id_producto = %s",
+    "categoria": "id_producto IN (SELECT id_producto FROM productos WHERE categoria = %s)",
+    "autor": "id_producto IN (SELECT id_producto FROM productos WHERE autor = %s)",
+}
+
+def entero_json(valor, nombre):
+    """Devuelve `valor` si es un entero JSON (no bool ni decimal); si no, lanza ValueError."""
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise ValueError(f"{nombre} debe ser un número entero")
+    return valor
+
+def filtro_masivo(datos, columna_id, filtros_validos):
+    """Arma el WHERE a partir de "ids" y/o "filtro" del JSON. Lanza ValueError si no selecciona nada."""
+    if not isinstance(datos, dict):
+        raise ValueError("El cuerpo debe ser un objeto JSON")
+    condiciones, valores = [], []
+    # Solo la ausencia de la clave (o null) cuenta como "no indicado"; 0, false o "" se rechazan
+    ids = datos.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("ids debe ser una lista no vacía")
+        ids = [entero_json(i, "Cada id") for i in ids]
+        condiciones.append(f"{columna_id} IN ({', '.join(['%s'] * len(ids))})")
+        valores += ids
+
+    filtro = datos.get("filtro")
+    if filtro is not None and (not isinstance(filtro, dict) or not filtro):
+        raise ValueError("filtro debe ser un objeto no vacío")
+    filtro = filtro or {}
+    desconocidos = [c for c in filtro if c not in filtros_validos]
+    if desconocidos:
+        raise ValueError(f"Filtros no soportados: {', '.join(desconocidos)}")
+    for campo, valor in filtro.items():
+        if isinstance(valor, bool) or not isinstance(valor, (str, int)):
+            raise ValueError(f"El filtro {campo} debe ser un texto o un número entero")
+        if isinstance(valor, str) and not valor.strip():
+            raise ValueError(f"El filtro {campo} no puede estar vacío")
+        condiciones.append(filtros_validos[campo])
+        valores.append(valor)
+
+    # Nunca se aplica una operación masiva a toda la tabla por omisión
+    if not condiciones:
+        raise ValueError("Indica ids o un filtro")
+    return " AND ".join(condiciones), valores
+
+# Subida máxima de precio admitida en una operación masiva (%)
+PRECIO_PORCENTAJE_MAXIMO = 1000
+
+def cambios_masivos(datos, permitir_precio, cantidad_minima):
+    """
+    Traduce "cambios" (precio_porcentaje, cantidad_delta) a la parte SET del UPDATE.
+    La cantidad resultante nunca baja de `cantidad_minima`.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("El cuerpo debe ser un objeto JSON")
+    cambios = datos.get("cambios")
+    if not isinstance(cambios, dict):
+        raise ValueError("cambios debe ser un objeto")
+    asignaciones, valores = [], []
+    if permitir_precio and "precio_porcentaje" in cambios:
+        porcentaje = cambios["precio_porcentaje"]
+        if isinstance(porcentaje, bool) or not isinstance(porcentaje, (int, float)) or not math.isfinite(porcentaje):
+            raise ValueError("precio_porcentaje debe ser un número")
+        # -100 % o menos dejaría precios en cero o negativos
+        if porcentaje <= -100 or porcentaje > PRECIO_PORCENTAJE_MAXIMO:
+            raise ValueError(f"precio_porcentaje debe ser mayor que -100 y como máximo {PRECIO_PORCENTAJE_MAXIMO}")
+        asignaciones.append("precio = ROUND(precio * (1 + %s / 100), 2)")
+        valores.append(float(porcentaje))
+    if "cantidad_delta" in cambios:
+        asignaciones.append("cantidad = GREATEST(cantidad + %s, %s)")
+        valores += [entero_json(cambios["cantidad_delta"], "cantidad_delta"), cantidad_minima]
+    if not asignaciones:
+        raise ValueError("No hay cambios válidos para aplicar")
+    return ", ".join(asignaciones), valores
+
+def ejecutar_masivo(query, valores, cambia_productos=False):
+    try:
+        afectados = mysql_async.ejecutar(mysql_async.modificar(query, tuple(valores)))
+    except IntegrityError:
+        return jsonify({"error": "Algunos registros están referenciados por pedidos; no se modificó nada"}), 409
+    except DataError:
+        # p. ej. un precio que ya no cabe en DECIMAL(10,2)
+        return jsonify({"error": "Los valores resultantes no son válidos para la base de datos; no se modificó nada"}), 400
+    if cambia_productos and afectados:
+        marcar_productos_modificados()
+    return jsonify({"afectados": afectados})
+
+@bp.route("/productos/masivo/eliminar", methods=["POST"])
+@login_required
+def eliminar_productos_masivo():
+    datos = request.get_json(silent=True) or {}
+    try:
+        where, valores = filtro_masivo(datos, "id_producto", FILTROS_MASIVOS_PRODUCTOS)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return ejecutar_masivo(f"DELETE FROM productos WHERE {where}", valores, cambia_productos=True)
+
+@bp.route("/productos/masivo/actualizar", methods=["POST"])
+@login_required
+def actualizar_productos_masivo():
+    datos = request.get_json(silent=True) or {}
+    try:
+        asignaciones, valores_set = cambios_masivos(datos, permitir_precio=True, cantidad_minima=0)
+        where, valores = filtro_masivo(datos, "id_producto", FILTROS_MASIVOS_PRODUCTOS)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return ejecutar_masivo(f"UPDATE productos SET {asignaciones} WHERE {where}", valores_set + valores, cambia_productos=True)
+
+@bp.route("/pedidos/masivo/eliminar", methods=["POST"])
+@login_required
+def eliminar_pedidos_masivo():
+    datos = request.get_json(silent=True) or {}
+    try:
+        where, valores = filtro_masivo(datos, "id_pedido", FILTROS_MASIVOS_PEDIDOS)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return ejecutar_masivo(f"DELETE FROM pedidos WHERE {where}", valores)
+
+@bp.route("/pedidos/masivo/actualizar", methods=["POST"])
+@login_required
+def actualizar_pedidos_masivo():
+    datos = request.get_json(silent=True) or {}
+    try:
+        asignaciones, valores_set = cambios_masivos(datos, permitir_precio=False, cantidad_minima=1)
+        where, valores = filtro_masivo(datos, "id_pedido", FILTROS_MASIVOS_PEDIDOS)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return ejecutar_masivo(f"UPDATE pedidos SET {asignaciones} WHERE {where}", valores_set + valores)
+
+# -----------------------------
+# API JSON (productos y pedidos)
+# -----------------------------
+# Campos expuestos por la API -> expresión SQL que los produce
+API_CAMPOS_PRODUCTOS = {
+    "id_producto": "id_producto",
+    "titulo": "titulo",
+    "autor": "autor",
+    "categoria": "categoria",
+    "cantidad": "cantidad",
+    "precio": "precio",
+    "portada": "portada",
+}
+API_CAMPOS_PEDIDOS = {
+    "id_pedido": "p.id_pedido",
+    "id_usuario": "p.id_usuario",
+    "id_producto": "p.id_producto",
+    "cliente": "u.nombre",
+    "producto": "pr.titulo",
+    "cantidad": "p.cantidad",
+    "fecha": "p.fecha_pedido",
+}
+API_LIMITE_POR_DEFECTO = 50
+API_LIMITE_MAXIMO = 500
+
+def api_parametros(campos_validos, clave):
+    """Lee ?fields=, ?after= y ?limit= de la petición. Lanza ValueError si son inválidos."""
+    campos = [c.strip() for c in request.args.get("fields", "").split(",") if c.strip()]
+    if not campos:
+        campos = list(campos_validos)
+    desconocidos = [c for c in campos if c not in campos_validos]
+    if desconocidos:
+        raise ValueError(f"Campos no soportados: {', '.join(desconocidos)}")
+    # La clave de paginación siempre se devuelve para poder pedir la siguiente página
+    if clave not in campos:
+        campos.insert(0, clave)
+
+    # Se validan a mano: con type=int un valor mal formado pasaría como "sin valor"
+    # y un cliente con el cursor roto recibiría la primera página para siempre
+    after = request.args.get("after")
+    limite = request.args.get("limit", str(API_LIMITE_POR_DEFECTO))
+    try:
+        after = int(after) if after is not None else None
+        limite = int(limite)
+    except ValueError:
+        raise ValueError("after y limit deben ser números enteros")
+    if limite < 1:
+        raise ValueError("El parámetro limit debe ser mayor que 0")
+    return campos, after, min(limite, API_LIMITE_MAXIMO)
+
+def api_respuesta(filas, clave, limite):
+    """Arma la respuesta JSON paginada con ETag y responde 304 si el cliente ya la tiene."""
+    siguiente = filas[limite - 1][clave] if len(filas) > limite else None
+    respuesta = jsonify({"data": filas[:limite], "next_after": siguiente})
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    respuesta.add_etag()
+    return respuesta.make_conditional(request)
+
+@bp.route("/api/productos", methods=["GET"])
+@login_required
+def api_productos():
+    try:
+        campos, after, limite = api_parametros(API_CAMPOS_PRODUCTOS, "id_producto")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    condiciones, valores = [], []
+    busqueda = request.args.get("busqueda", "").strip()
+    if busqueda:
+        condiciones.append("(titulo LIKE %s OR autor LIKE %s OR categoria LIKE %s)")
+        valores += [f"{busqueda}%", f"{busqueda}%", f"{busqueda}%"]
+    if after is not None:
+        condiciones.append("id_producto > %s")
+        valores.append(after)
+
+    columnas = ", ".join(f"{API_CAMPOS_PRODUCTOS[c]} AS {c}" for c in campos)
+    query = f"SELECT {columnas} FROM productos"
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    query += " ORDER BY id_producto LIMIT %s"
+    valores.append(limite + 1)
+
+    productos = consultar_en_hilo(query, tuple(valores))
+
+    # precio es DECIMAL(10,2); se envía como número JSON igual que cantidad
+    for producto in productos:
+        if producto.get("precio") is not None:
+            producto["precio"] = float(producto["precio"])
+    return api_respuesta(productos, "id_producto", limite)
+
+@bp.route("/api/pedidos", methods=["GET"])
+@login_required
+def api_pedidos():
+    try:
+        campos, after, limite = api_parametros(API_CAMPOS_PEDIDOS, "id_pedido")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    condiciones, valores = [], []
+    busqueda = request.args.get("busqueda", "").strip()
+    if busqueda:
+        condiciones.append("(u.nombre LIKE %s OR pr.titulo LIKE %s)")
+        valores += [f"{busqueda}%", f"{busqueda}%"]
+    if after is not None:
+        condiciones.append("p.id_pedido > %s")
+        valores.append(after)
+
+    columnas = ", ".join(f"{API_CAMPOS_PEDIDOS[c]} AS {c}" for c in campos)
+    query = f"""
+        SELECT {columnas}
+        FROM pedidos p
+        JOIN usuarios u ON p.id_usuario = u.id_usuario
+        JOIN productos pr ON p.id_producto = pr.id_producto
+    """
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    query += " ORDER BY p.id_pedido LIMIT %s"
+    valores.append(limite + 1)
+
+    pedidos = consultar_en_hilo(query, tuple(valores))
+
+    for pedido in pedidos:
+        if "fecha" in pedido:
+            pedido["fecha"] = str(pedido["fecha"])
+    return api_respuesta(pedidos, "id_pedido", limite)
+
+# -----------------------------
+# Fábrica de la aplicación
+# -----------------------------
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = "supersecreto"
+    app.config['UPLOAD_FOLDER'] = Path(app.root_path) / "static" / "portadas"
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
 # -----------------------------
 # Ejecutar aplicación
 # -----------------------------
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
 
@@ -0,0 +1,43 @@
+import tracemalloc
+from dataclasses import dataclass
+
+from models import Producto
+
+# Cantidad de libros simulados y valores de prueba
+N = 200_000
+AUTORES = ["Victor Hugo", "León Tolstói", "Gabriel García Márquez", "Jane Austen"]
+CATEGORIAS = ["Novela", "Ficción Histórica", "Poesía", "Ensayo"]
+
+
+@dataclass
+class ProductoConDict:
+    """Producto como era antes: dataclass normal con __dict__ y sin interning."""
+    id: int
+    titulo: str
+    autor: str
+    categoria: str
+    cantidad: int
+    precio: float
+
+
+def filas():
+    # Los textos se construyen en cada fila, igual que al leerlos de la BD
+    for i in range(N):
+        yield (i, f"Libro {i}", "".join(AUTORES[i % 4]), "".join(CATEGORIAS[i % 4]), i % 50, 9.99 + i % 7)
+
+
+def medir(nombre, crear):
+    """Mide la memoria que ocupa un dict id -> producto, como Inventario._items."""
+    tracemalloc.start()
+    items = {f[0]: crear(*f) for f in filas()}
+    usado, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nombre:<18} {usado / N:8.1f} bytes/libro")
+    return usado
+
+
+if __name__ == "__main__":
+    print(f"Inventario simulado de {N} libros")
+    antes = medir("dataclass normal", ProductoConDict)
+    ahora = medir("Producto (slots)", Producto)
+    print(f"Ahorro: {(1 - ahora / antes) * 100:.0f}%")
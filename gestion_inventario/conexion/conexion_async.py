@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+
+import aiomysql
+
+
+class MySQLAsync:
+    """
+    Bucle de eventos en un hilo dedicado con un pool aiomysql compartido.
+
+    Las vistas siguen siendo síncronas: cada hilo del servidor (gunicorn
+    gthread) entrega a este bucle solo sus consultas y espera el resultado,
+    mientras el renderizado y la serialización se hacen en el propio hilo.
+    Así un proceso puede tener muchas peticiones esperando a MySQL a la vez.
+    """
+
+    def __init__(self, host, user, password, database, port=3306, maxsize=20):
+        self._config = {
+            "host": host,
+            "user": user,
+            "password": password,
+            "db": database,
+            "port": port,
+            "maxsize": maxsize,
+        }
+        self._loop = None
+        self._hilo = None
+        self._pool = None
+        self._pool_lock = None
+        self._lock = threading.Lock()
+
+    def _bucle(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._hilo = threading.Thread(target=self._loop.run_forever, name="mysql-async", daemon=True)
+                self._hilo.start()
+        return self._loop
+
+    def ejecutar(self, coro):
+        """Ejecuta la corrutina en el bucle compartido conservando el contexto de Flask y devuelve su resultado."""
+        loop = self._bucle()
+        if threading.current_thread() is self._hilo:
+            coro.close()
+            raise RuntimeError("ejecutar() no puede llamarse desde el propio bucle async; usa await")
+
+        resultado = concurrent.futures.Future()
+
+        def _terminar(tarea):
+            if tarea.cancelled():
+                resultado.cancel()
+            elif tarea.exception() is not None:
+                resultado.set_exception(tarea.exception())
+            else:
+                resultado.set_result(tarea.result())
+
+        def _programar():
+            # La tarea hereda el contexto copiado, así request/current_user siguen disponibles
+            asyncio.ensure_future(coro).add_done_callback(_terminar)
+
+        loop.call_soon_threadsafe(_programar, context=contextvars.copy_context())
+        return resultado.result()
+
+    def ejecutar_todos(self, *coros):
+        """Ejecuta varias consultas independientes a la vez y devuelve sus resultados en orden."""
+        async def _reunir():
+            return await asyncio.gather(*coros)
+        return self.ejecutar(_reunir())
+
+    async def _obtener_pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(minsize=1, autocommit=True, **self._config)
+        return self._pool
+
+    # --- Consultas ---
+    async def consultar_todos(self, query, valores=(), diccionario=True):
+        pool = await self._obtener_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor if diccionario else aiomysql.Cursor) as cursor:
+                await cursor.execute(query, valores)
+                return await cursor.fetchall()
+
+    async def consultar_uno(self, query, valores=(), diccionario=True):
+        pool = await self._obtener_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor if diccionario else aiomysql.Cursor) as cursor:
+                await cursor.execute(query, valores)
+                return await cursor.fetchone()
+
+    async def modificar(self, query, valores=()):
+        """Ejecuta un INSERT/UPDATE/DELETE en su propia transacción y devuelve las filas afectadas."""
+        pool = await self._obtener_pool()
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(query, valores)
+                    filas = cursor.rowcount
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            return filas
@@ -25,6 +25,19 @@ CREATE TABLE IF NOT EXISTS productos (
 );
 
 
+-- -----------------------------
+-- Versión de productos (para la caché de analítica)
+-- La aplicación la incrementa una vez por operación, después del commit;
+-- si falta, la aplicación la crea al abrir la analítica
+-- -----------------------------
+CREATE TABLE IF NOT EXISTS productos_version (
+    id INT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO productos_version (id, version) VALUES (1, 0);
+
+
 -- -----------------------------
 -- Crear tabla pedidos
 -- -----------------------------
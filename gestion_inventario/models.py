@@ -1,7 +1,15 @@
+import atexit
+import marshal
+import os
 import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Flask-Login
 from flask_login import UserMixin
@@ -9,7 +17,13 @@ from flask_login import UserMixin
 
 # Configuración SQLite
 
-DB_PATH = Path("inventario.sqlite3")
+DB_PATH = Path(__file__).resolve().parent / "inventario.sqlite3"
+
+# Versión del formato del snapshot del inventario; subirla invalida los snapshots existentes
+SNAPSHOT_VERSION = 3
+
+# El formato de marshal depende del intérprete: un snapshot solo vale para la misma versión de Python
+SNAPSHOT_INTERPRETE = (sys.implementation.name, sys.version_info[:2], marshal.version)
 
 
 
@@ -31,10 +45,14 @@ class Usuario(UserMixin):
 
 # Modelo de Producto (SQLite)
 
-@dataclass
+@dataclass(slots=True)
 class Producto:
     """
     Representa un libro en el inventario.
+
+    Usa __slots__ (sin __dict__ por instancia) y comparte en memoria los
+    textos repetidos de autor y categoría, ya que el inventario guarda un
+    objeto por libro.
     """
     id: int
     titulo: str      # Título del libro
@@ -46,8 +64,8 @@ class Producto:
     def __post_init__(self) -> None:
         """Validaciones al crear la instancia."""
         self.titulo = self.titulo.strip()
-        self.autor = self.autor.strip()
-        self.categoria = self.categoria.strip()
+        self.autor = sys.intern(self.autor.strip())
+        self.categoria = sys.intern(self.categoria.strip())
         if not self.titulo:
             raise ValueError("El título no puede estar vacío.")
         if not self.autor:
@@ -62,6 +80,18 @@ class Producto:
     def to_tuple(self) -> tuple:
         return (self.id, self.titulo, self.autor, self.categoria, self.cantidad, self.precio)
 
+    @classmethod
+    def sin_validar(cls, id_: int, titulo: str, autor: str, categoria: str, cantidad: int, precio: float) -> "Producto":
+        """Crea el producto sin pasar por __post_init__; solo para datos ya validados (p. ej. el snapshot)."""
+        p = cls.__new__(cls)
+        p.id = id_
+        p.titulo = titulo
+        p.autor = sys.intern(autor)
+        p.categoria = sys.intern(categoria)
+        p.cantidad = cantidad
+        p.precio = precio
+        return p
+
 
 
 # Repositorio de Productos (SQLite)
@@ -80,6 +110,11 @@ class ProductoRepository:
         conn.row_factory = sqlite3.Row
         return conn
 
+    def huella(self) -> int:
+        """Versión de la tabla productos; los triggers la incrementan con cada alta, cambio o baja."""
+        with self._conn() as con:
+            return int(con.execute("SELECT version FROM productos_version WHERE id = 1").fetchone()[0])
+
     def _ensure_schema(self) -> None:
         with self._conn() as con:
             con.execute(
@@ -94,6 +129,27 @@ class ProductoRepository:
                 )
                 """
             )
+            # Contador de versión para saber si el snapshot del inventario sigue vigente;
+            # lo mantienen triggers, así también cuenta las escrituras hechas fuera de esta clase
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS productos_version (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+            con.execute("INSERT OR IGNORE INTO productos_version(id, version) VALUES(1, 0)")
+            for evento in ("INSERT", "UPDATE", "DELETE"):
+                con.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS productos_version_{evento.lower()}
+                    AFTER {evento} ON productos
+                    BEGIN
+                        UPDATE productos_version SET version = version + 1 WHERE id = 1;
+                    END
+                    """
+                )
 
     # --- Métodos CRUD ---
     def crear(self, p: Producto) -> None:
@@ -118,6 +174,23 @@ class ProductoRepository:
             if cur.rowcount == 0:
                 raise KeyError(f"No existe producto con ID {id_}")
 
+    def aplicar_lote(self, crear: List[Producto], actualizar: List[Producto], eliminar: List[int]) -> None:
+        """Aplica altas, cambios y bajas en una sola transacción; si algo falla no se guarda nada."""
+        with self._conn() as con:
+            con.executemany(
+                "INSERT INTO productos(id, titulo, autor, categoria, cantidad, precio) VALUES(?,?,?,?,?,?)",
+                [p.to_tuple() for p in crear],
+            )
+            cur = con.executemany(
+                "UPDATE productos SET titulo=?, autor=?, categoria=?, cantidad=?, precio=? WHERE id=?",
+                [(p.titulo, p.autor, p.categoria, p.cantidad, p.precio, p.id) for p in actualizar],
+            )
+            if actualizar and cur.rowcount != len(actualizar):
+                raise KeyError("Alguno de los productos a actualizar no existe")
+            cur = con.executemany("DELETE FROM productos WHERE id=?", [(id_,) for id_ in eliminar])
+            if eliminar and cur.rowcount != len(eliminar):
+                raise KeyError("Alguno de los productos a eliminar no existe")
+
     def obtener(self, id_: int) -> Optional[Producto]:
         with self._conn() as con:
             row = con.execute("SELECT * FROM productos WHERE id=?", (id_,)).fetchone()
@@ -168,44 +241,293 @@ class ProductoRepository:
 
 
 
+# Lote de cambios (unidad de trabajo)
+
+class LoteInventario:
+    """
+    Acumula altas, cambios y bajas sobre un Inventario y los guarda juntos.
+
+    Los cambios sobre el mismo producto se combinan: solo se escribe su
+    estado final (p. ej. agregar y luego eliminar no toca la BD).
+    """
+
+    def __init__(self, inventario: "Inventario") -> None:
+        self._inventario = inventario
+        # id -> (existía en la BD, estado final o None si se elimina)
+        self._cambios: Dict[int, Tuple[bool, Optional[Producto]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._cambios)
+
+    def _existe(self, id_: int) -> bool:
+        if id_ in self._cambios:
+            return self._cambios[id_][1] is not None
+        return id_ in self._inventario._items
+
+    def _registrar(self, id_: int, final: Optional[Producto]) -> None:
+        existia = self._cambios[id_][0] if id_ in self._cambios else id_ in self._inventario._items
+        self._cambios[id_] = (existia, final)
+
+    def agregar_producto(self, p: Producto) -> None:
+        if self._existe(p.id):
+            raise KeyError(f"Ya existe producto con ID {p.id}")
+        self._registrar(p.id, p)
+
+    def eliminar_producto(self, id_: int) -> None:
+        if not self._existe(id_):
+            raise KeyError(f"No existe producto con ID {id_}")
+        self._registrar(id_, None)
+
+    def actualizar_producto(self, p: Producto) -> None:
+        if not self._existe(p.id):
+            raise KeyError(f"No existe producto con ID {p.id}")
+        self._registrar(p.id, p)
+
+    def _guardar(self, ids: Iterable[int]) -> None:
+        """Guarda en una transacción los cambios de `ids` y, solo si tiene éxito, los aplica a _items."""
+        crear: List[Producto] = []
+        actualizar: List[Producto] = []
+        eliminar: List[int] = []
+        for id_ in ids:
+            existia, final = self._cambios[id_]
+            if final is None:
+                if existia:
+                    eliminar.append(id_)
+            elif existia:
+                actualizar.append(final)
+            else:
+                crear.append(final)
+        self._inventario.repo.aplicar_lote(crear, actualizar, eliminar)
+
+        items = self._inventario._items
+        for id_ in ids:
+            final = self._cambios.pop(id_)[1]
+            if final is None:
+                items.pop(id_, None)
+            else:
+                items[id_] = final
+
+    def confirmar(self) -> None:
+        """Guarda todos los cambios en una sola transacción; si falla, la cola queda intacta."""
+        self._guardar(list(self._cambios))
+
+    def confirmar_uno_a_uno(self) -> List[int]:
+        """
+        Guarda cada cambio en su propia transacción, descartando los que
+        chocan con la BD (p. ej. una fila borrada por fuera). Devuelve sus ids.
+        """
+        fallidos: List[int] = []
+        for id_ in list(self._cambios):
+            try:
+                self._guardar([id_])
+            except (KeyError, sqlite3.IntegrityError):
+                self._cambios.pop(id_)
+                fallidos.append(id_)
+        return fallidos
+
+
+
 # Inventario en memoria
 
 class Inventario:
     """
     Mantiene los productos en memoria para operaciones rápidas.
+
+    Al arrancar intenta cargar un snapshot binario junto a la BD; solo si
+    falta o no corresponde al estado actual de la BD se lee desde SQLite.
     """
 
-    def __init__(self, repo: ProductoRepository) -> None:
+    def __init__(
+        self,
+        repo: ProductoRepository,
+        snapshot_path: Optional[Path] = None,
+        write_behind: bool = False,
+        max_pendientes: int = 500,
+        max_retraso: float = 5.0,
+    ) -> None:
         self.repo = repo
+        self.snapshot_path = snapshot_path or Path(repo.db_path).with_suffix(".snapshot")
         self._items: Dict[int, Producto] = {}
-        self._cargar_desde_bd()
+        # Protege _items y los cambios pendientes frente a varios hilos (gunicorn gthread)
+        self._lock = threading.RLock()
+        # En modo write-behind los cambios se ven al instante en memoria y se guardan
+        # en bloque con sincronizar(), al llegar a max_pendientes, cuando un temporizador
+        # vence max_retraso segundos después del cambio más antiguo o al terminar el
+        # proceso de forma normal. Si el proceso muere sin aviso (SIGKILL) se pierden
+        # los cambios de esa última ventana.
+        self._pendientes: Optional[LoteInventario] = LoteInventario(self) if write_behind else None
+        self.max_pendientes = max_pendientes
+        self.max_retraso = max_retraso
+        self._temporizador: Optional[threading.Timer] = None
+        if write_behind:
+            atexit.register(_sincronizar_al_salir, weakref.ref(self))
+        if not self._cargar_desde_snapshot():
+            # La versión se lee antes de cargar: si alguien escribe entretanto, el snapshot
+            # queda marcado como viejo y se descarta en el próximo arranque
+            version = self.repo.huella()
+            self._cargar_desde_bd()
+            try:
+                self.guardar_snapshot(version)
+            except OSError:
+                pass  # sin snapshot el próximo arranque simplemente lee la BD
 
     def _cargar_desde_bd(self) -> None:
         for p in self.repo.listar():
             self._items[p.id] = p
 
+    def _cargar_desde_snapshot(self) -> bool:
+        """Carga _items desde el snapshot. Devuelve False si no existe, es de otra versión o está desactualizado."""
+        try:
+            formato, interprete, huella, filas = marshal.loads(self.snapshot_path.read_bytes())
+            if formato != SNAPSHOT_VERSION or tuple(interprete) != SNAPSHOT_INTERPRETE or huella != self.repo.huella():
+                return False
+            # Las filas ya se validaron al generar el snapshot
+            items = {fila[0]: Producto.sin_validar(*fila) for fila in filas}
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            return False
+        self._items = items
+        return True
+
+    def guardar_snapshot(self, huella: Optional[int] = None) -> None:
+        """
+        Escribe el snapshot de forma atómica. `huella` es la versión de la BD
+        con la que coincide _items (por defecto, la actual).
+        """
+        if huella is None:
+            huella = self.repo.huella()
+        filas = [self._items[k].to_tuple() for k in sorted(self._items.keys())]
+        # Archivo temporal único: varios workers pueden guardar el snapshot a la vez
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot_path.parent, prefix=self.snapshot_path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((SNAPSHOT_VERSION, SNAPSHOT_INTERPRETE, huella, filas), f)
+            os.replace(tmp, self.snapshot_path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    # Lotes / write-behind
+    @contextmanager
+    def lote(self) -> Iterator[LoteInventario]:
+        """
+        Agrupa cambios en una sola transacción:
+
+            with inventario.lote() as lote:
+                lote.actualizar_producto(p)
+
+        Si el bloque lanza una excepción no se guarda ni se aplica nada.
+        """
+        self.sincronizar()
+        lote = LoteInventario(self)
+        yield lote
+        with self._lock:
+            lote.confirmar()
+
+    def sincronizar(self) -> List[int]:
+        """
+        Guarda los cambios pendientes del modo write-behind (no hace nada si no está activo).
+
+        Si algún cambio choca con la BD, se guardan los demás y esos productos
+        se recargan desde la BD; devuelve sus ids.
+        """
+        if self._pendientes is None:
+            return []
+        with self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+            if not len(self._pendientes):
+                return []
+            try:
+                return self._confirmar_pendientes()
+            finally:
+                # Si un error transitorio deja cambios en cola, se reintenta al vencer el plazo
+                if len(self._pendientes):
+                    self._armar_temporizador()
+
+    def _confirmar_pendientes(self) -> List[int]:
+        try:
+            self._pendientes.confirmar()
+            return []
+        except (KeyError, sqlite3.IntegrityError):
+            fallidos = self._pendientes.confirmar_uno_a_uno()
+        for id_ in fallidos:
+            p = self.repo.obtener(id_)
+            if p is None:
+                self._items.pop(id_, None)
+            else:
+                self._items[id_] = p
+        return fallidos
+
+    def _armar_temporizador(self) -> None:
+        if self._temporizador is None:
+            self._temporizador = threading.Timer(self.max_retraso, _sincronizar_por_tiempo, args=(weakref.ref(self),))
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def _diferir(self, id_: int, final: Optional[Producto]) -> None:
+        self._pendientes._registrar(id_, final)
+        if final is None:
+            self._items.pop(id_)
+        else:
+            self._items[id_] = final
+        if len(self._pendientes) >= self.max_pendientes:
+            self.sincronizar()
+        else:
+            self._armar_temporizador()
+
     # CRUD
     def agregar_producto(self, p: Producto) -> None:
-        if p.id in self._items:
-            raise KeyError(f"Ya existe producto con ID {p.id}")
-        self.repo.crear(p)
-        self._items[p.id] = p
+        with self._lock:
+            if p.id in self._items:
+                raise KeyError(f"Ya existe producto con ID {p.id}")
+            if self._pendientes is not None:
+                self._diferir(p.id, p)
+                return
+            self.repo.crear(p)
+            self._items[p.id] = p
 
     def eliminar_producto(self, id_: int) -> None:
-        if id_ not in self._items:
-            raise KeyError(f"No existe producto con ID {id_}")
-        self.repo.eliminar(id_)
-        self._items.pop(id_)
+        with self._lock:
+            if id_ not in self._items:
+                raise KeyError(f"No existe producto con ID {id_}")
+            if self._pendientes is not None:
+                self._diferir(id_, None)
+                return
+            self.repo.eliminar(id_)
+            self._items.pop(id_)
 
     def actualizar_producto(self, p: Producto) -> None:
-        if p.id not in self._items:
-            raise KeyError(f"No existe producto con ID {p.id}")
-        self.repo.actualizar(p)
-        self._items[p.id] = p
+        with self._lock:
+            if p.id not in self._items:
+                raise KeyError(f"No existe producto con ID {p.id}")
+            if self._pendientes is not None:
+                self._diferir(p.id, p)
+                return
+            self.repo.actualizar(p)
+            self._items[p.id] = p
 
     def buscar_por_nombre(self, titulo: str) -> List[Producto]:
         """Delegamos búsqueda parcial al repositorio"""
         return self.repo.buscar_por_nombre(titulo)
 
     def listar_todos(self) -> List[Producto]:
-        return [self._items[k] for k in sorted(self._items.keys())]
+        with self._lock:
+            return [self._items[k] for k in sorted(self._items.keys())]
+
+
+def _sincronizar_por_tiempo(ref: "weakref.ref[Inventario]") -> None:
+    """Guarda los cambios write-behind cuando vence max_retraso."""
+    inventario = ref()
+    if inventario is not None:
+        inventario.sincronizar()
+
+
+def _sincronizar_al_salir(ref: "weakref.ref[Inventario]") -> None:
+    """Guarda los cambios write-behind que queden al terminar el proceso."""
+    inventario = ref()
+    if inventario is not None:
+        inventario.sincronizar()